@@ -0,0 +1,51 @@
+# Process pool workers for PDF extraction. They live outside phase1_2.py because
+# Streamlit runs that script as __main__, which spawned workers cannot import.
+import sys
+
+from pdfminer.high_level import extract_text
+from pdfminer.layout import LAParams
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import resolve1
+
+# Printed page numbers trail the physical page by at most this much (cover, TOC pages)
+PAGE_NUMBER_MAX_OFFSET = 10
+
+
+def count_pdf_pages(path):
+    with open(path, "rb") as pdf_file:
+        document = PDFDocument(PDFParser(pdf_file))
+        # The page tree's Count avoids walking every page, but may be indirect or missing
+        try:
+            count = resolve1(resolve1(document.catalog["Pages"])["Count"])
+        except (KeyError, TypeError):
+            count = None
+        if isinstance(count, int) and count > 0:
+            return count
+        # create_pages falls back to scanning objects when the page tree is broken
+        return sum(1 for _ in PDFPage.create_pages(document))
+
+
+def extract_pdf_range(path, start, end=None):
+    # end=None reads to the last page, so a page tree that undercounts does not drop pages
+    page_numbers = range(start, sys.maxsize if end is None else end)
+    # boxes_flow=None skips pdfminer's textbox grouping pass; text keeps positional order
+    text = extract_text(path, page_numbers=page_numbers, laparams=LAParams(boxes_flow=None))
+    # pdfminer ends each page with a form feed; strip page numbers per page, then join with line breaks
+    pages = text.split('\f')
+    return '\n'.join(
+        _strip_page_number(page_text, start + offset + 1) for offset, page_text in enumerate(pages)
+    )
+
+
+def _strip_page_number(page_text, page_number):
+    # Only the first or last line of a page (header or footer) can be its page number; numeric
+    # lines elsewhere are usually table cells, and a value far from the page's position is one too
+    lines = page_text.split('\n')
+    content_lines = [index for index, line in enumerate(lines) if line.strip()]
+    for index in {content_lines[0], content_lines[-1]} if content_lines else ():
+        value = lines[index].strip()
+        if value.isdecimal() and page_number - PAGE_NUMBER_MAX_OFFSET <= int(value) <= page_number:
+            lines[index] = ''
+    return '\n'.join(lines)
@@ -1,43 +1,280 @@
 import streamlit as st
-from langchain_ollama import OllamaLLM
+from openai import OpenAI
+import aiohttp
+import asyncio
+import hashlib
+import io
+import json
 import os
-import pdfplumber
-from fpdf import FPDF
 import re
 import base64
-from docx import Document
-import nltk
+import tempfile
+import threading
+from xml.sax.saxutils import escape
+
+# OpenAI-compatible endpoint served by llama.cpp's llama-server
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL", "http://localhost:8080/v1")
+MODEL_NAME = os.environ.get("LLM_MODEL", "llama3.2")
+# Each worker gets at least this many pages; smaller PDFs are extracted in-process
+# because process start-up and per-worker re-parsing of the file would outweigh the gain
+PDF_PARALLEL_MIN_PAGES = 16
+PDF_WORKERS = min(os.cpu_count() or 1, 8)
+# Prompt cost grows faster than linearly with length, so only a bounded BRD prefix is sent
+MAX_BRD_CHARS = 8000
+
+USE_CASE_SECTIONS = {
+    "Actors": "List of all actors",
+    "Preconditions": "Conditions required before starting",
+    "Main Flow": "Detailed steps",
+    "Postconditions": "Expected outcomes",
+    "Exceptions": "Potential deviations"
+}
+
+CACHE_DIR = "cache"
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+SEMANTIC_CACHE_THRESHOLD = 0.95
+# MiniLM truncates at 256 word pieces, so the BRD is embedded in chunks of about that size
+EMBEDDING_CHUNK_CHARS = 1000
+# Share of distinct lines two BRDs must have in common before a semantic hit is trusted
+FINGERPRINT_THRESHOLD = 0.9
+
+# Splits an LLM response on its section headers in a single pass; headers may carry
+# heading marks, bold markers or a list marker such as "1." or "-". Every part of the
+# prefix stays on the header's line and starts with a distinct character, so a failed
+# match cannot backtrack across lines; a bullet "*" must be followed by a space, bold "**" not.
+_SECTION_SPLIT = re.compile(
+    r"^[ \t]*(?:#{1,6}[ \t]*)?(?:\*\*)?(?:(?:[-+*]|\d+[.)])[ \t]+)?(?:\*\*)?"
+    r"(" + "|".join(USE_CASE_SECTIONS) + r")[ \t*]*:[ \t*]*",
+    re.IGNORECASE | re.MULTILINE
+)
+_SECTION_NAMES = {section.lower(): section for section in USE_CASE_SECTIONS}
+
+# Whitespace noise stripped from extracted text before it reaches the LLM
+_WS_RE = re.compile(r"[ \t]+")
+_BLANK_RE = re.compile(r"\n{3,}")
+
+
+def _write_json_atomic(path, value):
+    # Write beside the target and rename, so readers never see a half-written file
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=os.path.dirname(path), suffix=".tmp", delete=False
+    ) as tmp_file:
+        json.dump(value, tmp_file)
+    try:
+        os.replace(tmp_file.name, path)
+    except OSError:
+        os.remove(tmp_file.name)
+        raise
+
+
+# Cache Module: return stored LLM output for repeated inputs
+class ExactCache:
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = os.path.join(cache_dir, "exact")
+
+    def _path(self, namespace, text):
+        # Keyed on the model too, so switching LLM_MODEL does not serve the old model's output
+        digest = hashlib.sha256(f"{MODEL_NAME}\0{text}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{namespace}-{digest}.json")
+
+    def get(self, namespace, text):
+        try:
+            with open(self._path(namespace, text), "r", encoding="utf-8") as cache_file:
+                return json.load(cache_file)
+        except (OSError, json.JSONDecodeError):
+            # Missing or unreadable entries are a miss; the next put overwrites them
+            return None
+
+    def put(self, namespace, text, value):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        _write_json_atomic(self._path(namespace, text), value)
+
+
+# Cache Module: reuse user stories for near-identical BRD uploads
+class SemanticCache:
+    def __init__(self, cache_dir=CACHE_DIR, threshold=SEMANTIC_CACHE_THRESHOLD):
+        # Optional and heavy (torch): imported here, and the cache is disabled without them
+        try:
+            import faiss
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            self.enabled = False
+            return
+        self.enabled = True
+        self._faiss = faiss
+        self.threshold = threshold
+        # Shared by every Streamlit session thread; index and store must change together
+        self._lock = threading.Lock()
+        self.index_path = os.path.join(cache_dir, "user_story.index")
+        self.store_path = os.path.join(cache_dir, "user_story.json")
+        self.embedder = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        self.index, self.store = self._load()
+
+    def _load(self):
+        dimension = self.embedder.get_sentence_embedding_dimension()
+        try:
+            index = self._faiss.read_index(self.index_path)
+            with open(self.store_path, "r", encoding="utf-8") as store_file:
+                store = json.load(store_file)
+            # A crash between the two writes leaves them out of step; start over rather than misindex
+            if index.ntotal == len(store) and index.d == dimension:
+                return index, store
+        except (OSError, RuntimeError, ValueError):
+            pass
+        # Inner product over normalized embeddings is cosine similarity
+        return self._faiss.IndexFlatIP(dimension), []
+
+    def _write_index_atomic(self):
+        tmp_fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.index_path), suffix=".tmp")
+        os.close(tmp_fd)
+        try:
+            self._faiss.write_index(self.index, tmp_path)
+            os.replace(tmp_path, self.index_path)
+        except (OSError, RuntimeError):
+            os.remove(tmp_path)
+            raise
+
+    def _embed(self, text):
+        # Mean of the chunk embeddings, so the whole BRD contributes and not just its first page
+        chunks = [
+            text[start:start + EMBEDDING_CHUNK_CHARS]
+            for start in range(0, len(text), EMBEDDING_CHUNK_CHARS)
+        ] or [""]
+        embedding = self.embedder.encode(chunks, normalize_embeddings=True).mean(axis=0, keepdims=True)
+        embedding = embedding.astype("float32")
+        self._faiss.normalize_L2(embedding)
+        return embedding
+
+    def _fingerprint(self, text):
+        return sorted({
+            hashlib.sha256(line.strip().encode("utf-8")).hexdigest()[:16]
+            for line in text.splitlines() if line.strip()
+        })
+
+    def _fingerprints_match(self, stored, current):
+        stored, current = set(stored), set(current)
+        union = stored | current
+        return not union or len(stored & current) / len(union) >= FINGERPRINT_THRESHOLD
+
+    def lookup(self, brd_content, prompt):
+        # Returns (completion or None, signature); pass the signature to add() on a miss
+        if not self.enabled:
+            return None, None
+        embedding = self._embed(brd_content)
+        fingerprint = self._fingerprint(brd_content)
+        signature = (embedding, fingerprint)
+        with self._lock:
+            if self.index.ntotal == 0:
+                return None, signature
+            scores, ids = self.index.search(embedding, min(5, self.index.ntotal))
+            candidates = [
+                self.store[entry_id]
+                for score, entry_id in zip(scores[0], ids[0]) if score >= self.threshold
+            ]
+        for entry in candidates:
+            # Embeddings of near-identical documents can still collide; confirm on content
+            if (
+                entry.get("model") == MODEL_NAME and entry["prompt"] == prompt
+                and self._fingerprints_match(entry.get("fingerprint", []), fingerprint)
+            ):
+                return entry["completion"], signature
+        return None, signature
+
+    def add(self, signature, prompt, completion):
+        if not self.enabled or signature is None:
+            return
+        embedding, fingerprint = signature
+        entry = {"model": MODEL_NAME, "prompt": prompt, "fingerprint": fingerprint, "completion": completion}
+        with self._lock:
+            self.index.add(embedding)
+            self.store.append(entry)
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            self._write_index_atomic()
+            _write_json_atomic(self.store_path, self.store)
+
+
+# PDF layout: draws the page border on every page, including automatic breaks
+def _draw_page_border(canvas, doc):
+    from reportlab.lib.units import mm
+
+    canvas.saveState()
+    canvas.setStrokeColorRGB(0, 0, 0)
+    canvas.setLineWidth(0.5)
+    canvas.rect(5 * mm, 5 * mm, 200 * mm, 287 * mm)
+    canvas.restoreState()
 
-# Initialize required nltk resources
-nltk.download('wordnet')
 
 # Backend Module: Extraction and Generation
 class BRDProcessor:
     def __init__(self):
-        self.llm = OllamaLLM(model="llama3.2")
+        # llama-server does not check the API key, but the client requires one
+        self.llm = OpenAI(base_url=LLM_BASE_URL, api_key="sk-no-key-required")
+        self.exact_cache = ExactCache()
+        self.cache = SemanticCache()
 
     def extract_text(self, uploaded_file, file_type):
         if file_type == "pdf":
-            return self._extract_text_from_pdf(uploaded_file)
+            text = self._extract_text_from_pdf(uploaded_file)
         elif file_type == "docx":
-            return self._extract_text_from_docx(uploaded_file)
+            text = self._extract_text_from_docx(uploaded_file)
         elif file_type == "txt":
-            return self._extract_text_from_txt(uploaded_file)
-        return None
+            text = self._extract_text_from_txt(uploaded_file)
+        else:
+            return None
+        return self._clean_text(text)
+
+    def _clean_text(self, text):
+        # Runs of spaces and blank lines only cost prompt tokens
+        text = _WS_RE.sub(' ', text)
+        return _BLANK_RE.sub('\n\n', text).strip()
 
     def _extract_text_from_pdf(self, pdf_file):
-        with pdfplumber.open(pdf_file) as pdf:
-            text = ''.join([page.extract_text() + '\n' for page in pdf.pages])
-        return text
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        from pdf_workers import count_pdf_pages, extract_pdf_range
+
+        # Workers open the PDF themselves, so write the upload to disk once
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp_file:
+            tmp_file.write(pdf_file.getvalue())
+        try:
+            page_count = count_pdf_pages(tmp_file.name)
+            workers = min(PDF_WORKERS, page_count // PDF_PARALLEL_MIN_PAGES)
+            if workers <= 1:
+                return extract_pdf_range(tmp_file.name, 0)
+
+            pages_per_worker = -(-page_count // workers)
+            starts = list(range(0, page_count, pages_per_worker))
+            # The last range is open-ended in case the page count is short
+            ends = starts[1:] + [None]
+            # Spawn, never fork: this runs on a Streamlit thread with torch/faiss threads alive
+            spawn_context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=len(starts), mp_context=spawn_context) as executor:
+                # map() returns results in submission order, so pages stay in sequence
+                parts = executor.map(extract_pdf_range, [tmp_file.name] * len(starts), starts, ends)
+                return '\n'.join(parts)
+        finally:
+            os.remove(tmp_file.name)
 
     def _extract_text_from_docx(self, docx_file):
+        from docx import Document
+
         doc = Document(docx_file)
-        return '\n'.join([paragraph.text for paragraph in doc.paragraphs])
+        # Skip blank paragraphs so they do not pad the LLM prompt
+        return '\n'.join(paragraph.text for paragraph in doc.paragraphs if paragraph.text)
 
     def _extract_text_from_txt(self, txt_file):
         return txt_file.read().decode('utf-8')
 
-    def create_user_story(self, brd_content, prompt=""):
+    def _truncate_brd(self, brd_content):
+        if len(brd_content) <= MAX_BRD_CHARS:
+            return brd_content
+        truncated = brd_content[:MAX_BRD_CHARS]
+        # Cut at the last line break so the prompt does not end mid-sentence
+        last_break = truncated.rfind('\n')
+        return truncated[:last_break] if last_break > 0 else truncated
+
+    def create_user_story_stream(self, brd_content, prompt=""):
+        brd_content = self._truncate_brd(brd_content)
         user_story_prompt = (
             f"Using the provided BRD content, generate a user story in a structured format. "
             f"Using the provided user_prompt, restructure the user story and if no user_prompt is given do not take it into consideration. "
@@ -50,72 +287,139 @@ class BRDProcessor:
             f"Exceptions: (Potential deviations)\n\n"
             f"Content:\n{brd_content}\nuser_prompt:\n{prompt}"
         )
-        return self.llm.invoke(user_story_prompt)
+        # Exact repeats are a hash and a file read; only then try the semantic cache
+        user_story = self.exact_cache.get("user_story", user_story_prompt)
+        if user_story is not None:
+            yield user_story
+            return
+        user_story, signature = self.cache.lookup(brd_content, prompt)
+        if user_story is not None:
+            yield user_story
+            return
+
+        # Yield tokens as they arrive so the UI can render before generation finishes
+        chunks = []
+        stream = self.llm.chat.completions.create(
+            model=MODEL_NAME, messages=[{"role": "user", "content": user_story_prompt}], stream=True
+        )
+        for chunk in stream:
+            token = chunk.choices[0].delta.content if chunk.choices else None
+            if token:
+                chunks.append(token)
+                yield token
+        user_story = ''.join(chunks)
+        # An empty completion is a failed generation, not an answer worth replaying
+        if user_story.strip():
+            self.exact_cache.put("user_story", user_story_prompt, user_story)
+            self.cache.add(signature, prompt, user_story)
 
     def create_use_case(self, user_story):
-        use_case_prompt = (
-            f"Extract the following information from the generated user story:\n"
-            f"Actors: (List of all actors)\n"
-            f"Preconditions: (Conditions required before starting)\n"
-            f"Main Flow: (Detailed steps)\n"
-            f"Postconditions: (Expected outcomes)\n"
-            f"Exceptions: (Potential deviations)\n\n"
+        use_case = self.exact_cache.get("use_case", user_story)
+        if use_case is not None:
+            return use_case
+
+        # The user story already follows the section format, so parse it directly
+        # and only ask the LLM for sections it did not produce
+        use_case = self._extract_use_case_info(user_story)
+        missing_sections = [
+            section for section, value in use_case.items()
+            if value == "No information available."
+        ]
+        if not missing_sections:
+            return use_case
+
+        # One prompt per missing section, sent concurrently so the calls overlap
+        use_case_prompts = [
+            f"Extract only the {section} ({USE_CASE_SECTIONS[section]}) from the generated user story. "
+            f"Output the {section} content only, without a heading.\n\n"
             f"User Story:\n{user_story}"
-        )
-        use_case = self.llm.invoke(use_case_prompt)
-        return self._extract_use_case_info(use_case)
+            for section in missing_sections
+        ]
+        responses = asyncio.run(self._generate_concurrently(use_case_prompts))
+        for section, response in zip(missing_sections, responses):
+            use_case[section] = response.strip() or "No information available."
+        self.exact_cache.put("use_case", user_story, use_case)
+        return use_case
+
+    async def _generate_concurrently(self, prompts):
+        # One pooled session per batch: it is bound to the event loop that asyncio.run creates
+        connector = aiohttp.TCPConnector(limit=8, keepalive_timeout=60)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            return await asyncio.gather(
+                *[self._generate(session, prompt) for prompt in prompts]
+            )
+
+    async def _generate(self, session, prompt):
+        payload = {"model": MODEL_NAME, "messages": [{"role": "user", "content": prompt}]}
+        async with session.post(f"{LLM_BASE_URL}/chat/completions", json=payload) as response:
+            response.raise_for_status()
+            return (await response.json())["choices"][0]["message"]["content"]
 
     def _extract_use_case_info(self, user_story):
-        patterns = {
-            "Actors": re.compile(r"Actors\s*:\s*(.*?)(?=Preconditions|$)", re.DOTALL | re.IGNORECASE),
-            "Preconditions": re.compile(r"Preconditions\s*:\s*(.*?)(?=Main Flow|$)", re.DOTALL | re.IGNORECASE),
-            "Main Flow": re.compile(r"Main Flow\s*:\s*(.*?)(?=Postconditions|$)", re.DOTALL | re.IGNORECASE),
-            "Postconditions": re.compile(r"Postconditions\s*:\s*(.*?)(?=Exceptions|$)", re.DOTALL | re.IGNORECASE),
-            "Exceptions": re.compile(r"Exceptions\s*:\s*(.*)", re.DOTALL | re.IGNORECASE)
-        }
-        use_case_info = {}
-        for key, pattern in patterns.items():
-            match = pattern.search(user_story)
-            use_case_info[key] = match.group(1).strip() if match else "No information available."
+        use_case_info = dict.fromkeys(USE_CASE_SECTIONS, "No information available.")
+        parts = _SECTION_SPLIT.split(user_story)
+        seen = set()
+        for header, content in zip(parts[1::2], parts[2::2]):
+            key = _SECTION_NAMES[header.lower()]
+            content = content.strip()
+            # Keep the first occurrence of each section, as the old search() did
+            if key not in seen and content:
+                use_case_info[key] = content
+                seen.add(key)
         return use_case_info
 
     def generate_pdf(self, use_case, file_name):
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_draw_color(0, 0, 0)
-        pdf.set_line_width(0.5)
-        pdf.rect(5, 5, 200, 287)
-        pdf.set_font("Times", 'B', size=16)
-        pdf.cell(0, 10, "Use Case Document", ln=True, align="C")
-        pdf.ln(10)
-        pdf.set_font("Times", 'B', size=12)
+        from reportlab.lib.enums import TA_CENTER
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.styles import ParagraphStyle
+        from reportlab.lib.units import mm
+        from reportlab.platypus import Paragraph, SimpleDocTemplate
+
+        title_style = ParagraphStyle(
+            "UseCaseTitle", fontName="Times-Bold", fontSize=16, leading=20,
+            alignment=TA_CENTER, spaceAfter=10 * mm
+        )
+        heading_style = ParagraphStyle("UseCaseHeading", fontName="Times-Bold", fontSize=12, leading=16)
+        body_style = ParagraphStyle(
+            "UseCaseBody", fontName="Times-Roman", fontSize=12, leading=16, spaceAfter=5 * mm
+        )
+
+        story = [Paragraph("Use Case Document", title_style)]
         for key, value in use_case.items():
-            pdf.cell(0, 10, f"{key}:", ln=True)
-            pdf.set_font("Times", size=12)
-            content_words = value.split()
-            current_text = ""
-            for word in content_words:
-                if len(current_text) + len(word) + 1 > 50:
-                    pdf.cell(0, 10, current_text, ln=True)
-                    current_text = word
-                    if pdf.get_y() + 10 > pdf.h - 20:
-                        pdf.add_page()
-                        pdf.set_draw_color(0, 0, 0)
-                        pdf.set_line_width(0.5)
-                        pdf.rect(5, 5, 200, 287)
-                else:
-                    current_text += (" " + word) if current_text else word
-            if current_text:
-                pdf.cell(0, 10, current_text, ln=True)
-            pdf.set_font("Times", 'B', size=12)
-            pdf.cell(0, 5, '', ln=True)
-        pdf.output(file_name)
+            story.append(Paragraph(escape(f"{key}:"), heading_style))
+            # Paragraph markup collapses newlines, so keep the LLM's line breaks explicitly
+            story.append(Paragraph(escape(value).replace("\n", "<br/>"), body_style))
+
+        doc = SimpleDocTemplate(
+            file_name, pagesize=A4, leftMargin=10 * mm, rightMargin=10 * mm,
+            topMargin=10 * mm, bottomMargin=20 * mm
+        )
+        doc.build(story, onFirstPage=_draw_page_border, onLaterPages=_draw_page_border)
 
 
 # UI Module: Display and Download
+@st.cache_resource
+def get_processor():
+    # One processor (LLM client, caches, embedding model) shared across reruns and sessions
+    return BRDProcessor()
+
+
+@st.cache_data
+def extract_uploaded_text(file_bytes, file_type):
+    # Keyed on the upload's bytes, so widget reruns do not re-extract (or restart the PDF pool)
+    return get_processor().extract_text(io.BytesIO(file_bytes), file_type)
+
+
+@st.cache_data
+def _image_to_b64(image_path: str) -> str:
+    # The background is static, so read and encode it once instead of on every rerun
+    with open(image_path, "rb") as img_file:
+        return base64.b64encode(img_file.read()).decode("utf-8")
+
+
 class UseCaseApp:
     def __init__(self):
-        self.processor = BRDProcessor()
+        self.processor = get_processor()
 
     def run(self):
         st.set_page_config(page_title="BRD to Use Case Generator", layout="wide")
@@ -129,7 +433,7 @@ class UseCaseApp:
 
         if uploaded_file:
             file_type = uploaded_file.name.split('.')[-1]
-            extracted_text = self.processor.extract_text(uploaded_file, file_type)
+            extracted_text = extract_uploaded_text(uploaded_file.getvalue(), file_type)
 
             if extracted_text:
                 st.success("BRD file uploaded and text extracted successfully.")
@@ -142,7 +446,7 @@ class UseCaseApp:
                 st.error("Failed to extract text from the uploaded file. Please check the file format and content.")
 
     def set_background(self, image_path):
-        image_base64 = self.convert_image_to_base64(image_path)
+        image_base64 = _image_to_b64(image_path)
         st.markdown(
             f"""
             <style>
@@ -167,13 +471,12 @@ class UseCaseApp:
         return uploaded_file, prompt
 
     def generate_outputs(self, extracted_text, prompt):
-        user_story = self.processor.create_user_story(extracted_text, prompt)
-        
         col1, col2 = st.columns(2)
         with col1:
-            with st.expander("USER STORY"):
+            # Expanded so the streamed tokens are visible while they arrive
+            with st.expander("USER STORY", expanded=True):
                 st.subheader("Generated User Story")
-                st.write(user_story)
+                user_story = st.write_stream(self.processor.create_user_story_stream(extracted_text, prompt))
         
         with col2:
             with st.expander("USE CASE"):
@@ -193,11 +496,6 @@ class UseCaseApp:
             st.markdown(value)
             st.markdown("")
 
-    @staticmethod
-    def convert_image_to_base64(image_path):
-        with open(image_path, "rb") as img_file:
-            return base64.b64encode(img_file.read()).decode("utf-8")
-
 
 if __name__ == "__main__":
     app = UseCaseApp()
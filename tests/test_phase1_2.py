@@ -0,0 +1,56 @@
+import importlib.util
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The parser needs none of the UI or LLM stack; stand in for whatever is not installed
+for module_name in ("streamlit", "openai", "aiohttp"):
+    if importlib.util.find_spec(module_name) is None:
+        sys.modules[module_name] = mock.MagicMock()
+
+from phase1_2 import BRDProcessor
+
+
+class ExtractUseCaseInfoTest(unittest.TestCase):
+    def extract(self, user_story):
+        # The parser does not touch instance state, so skip __init__ and its LLM client
+        return BRDProcessor._extract_use_case_info(object.__new__(BRDProcessor), user_story)
+
+    def test_plain_headers(self):
+        use_case = self.extract("Actors: Cargo agent\nPreconditions: Booking exists\nMain Flow: Load cargo")
+        self.assertEqual(use_case["Actors"], "Cargo agent")
+        self.assertEqual(use_case["Preconditions"], "Booking exists")
+        self.assertEqual(use_case["Main Flow"], "Load cargo")
+        self.assertEqual(use_case["Exceptions"], "No information available.")
+
+    def test_numbered_markdown_headers(self):
+        use_case = self.extract(
+            "1. **Actors:** Cargo agent\n"
+            "2) **Preconditions:**\n- Booking exists\n"
+            "**3. Main Flow:** Load cargo\n"
+            "### 4. Postconditions: Cargo loaded\n"
+            "5. Exceptions: Missing booking"
+        )
+        self.assertEqual(use_case["Actors"], "Cargo agent")
+        self.assertEqual(use_case["Preconditions"], "- Booking exists")
+        self.assertEqual(use_case["Main Flow"], "Load cargo")
+        self.assertEqual(use_case["Postconditions"], "Cargo loaded")
+        self.assertEqual(use_case["Exceptions"], "Missing booking")
+
+    def test_bulleted_headers(self):
+        use_case = self.extract("- Actors: Cargo agent\n* Main Flow: Load cargo\n+ Exceptions: None")
+        self.assertEqual(use_case["Actors"], "Cargo agent")
+        self.assertEqual(use_case["Main Flow"], "Load cargo")
+        self.assertEqual(use_case["Exceptions"], "None")
+
+    def test_star_bullets_keep_their_marker(self):
+        use_case = self.extract("**Actors:**\n* Agent\n* Customer\nPreconditions:\n* Booking exists")
+        self.assertEqual(use_case["Actors"], "* Agent\n* Customer")
+        self.assertEqual(use_case["Preconditions"], "* Booking exists")
+
+
+if __name__ == "__main__":
+    unittest.main()